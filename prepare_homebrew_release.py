@@ -16,9 +16,14 @@ def calculate_sha256(url):
     if response.status_code != 200:
         raise Exception(f"Failed to download {url}, status code: {response.status_code}")
     
-    # Calculate hash
+    # Calculate hash, reading the raw stream in large chunks
+    response.raw.decode_content = True
+    if hasattr(hashlib, 'file_digest'):
+        # Python 3.11+ hashes straight from the stream into a reused buffer
+        return hashlib.file_digest(response.raw, 'sha256').hexdigest()
+    
     sha256_hash = hashlib.sha256()
-    for chunk in response.iter_content(chunk_size=4096):
+    for chunk in iter(lambda: response.raw.read(1 << 20), b''):
         sha256_hash.update(chunk)
     
     return sha256_hash.hexdigest()
@@ -24,8 +24,8 @@ setup(
     python_requires=">=3.6",
     install_requires=[
         "requests>=2.31.0",
-        "beautifulsoup4>=4.12.2",
         "html2text>=2024.2.26",
+        "lxml>=4.9.0",
     ],
     entry_points={
         "console_scripts": [
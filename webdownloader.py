@@ -4,109 +4,336 @@
 
 import argparse
 import os
+import sys
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import lxml.html
+from lxml import etree
 from urllib.parse import urljoin, urlparse, urldefrag
 import time
 import re
 import base64
+import hashlib
+import shutil
+import sqlite3
+import threading
+import multiprocessing
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
 import html2text
 
-def is_valid_url(url, base_domain):
-    """Check if URL belongs to the same domain."""
-    parsed_url = urlparse(url)
-    parsed_base = urlparse(base_domain)
-    return parsed_url.netloc == parsed_base.netloc or not parsed_url.netloc
+# URL prefixes of pages and resources that can be downloaded
+_HTTP_SCHEMES = ('http://', 'https://')
+
+# Common language path patterns
+_NON_ENGLISH_PATTERNS = [
+    r'/[a-z]{2}(?:-[a-z]{2})?(?:/|$)', # language codes like /fr/, /es/, /zh-cn/, also at the end of URL
+    r'/(?:translations|intl|i18n)/',
+    r'/(?:spanish|espanol|français|deutsch|italiano|português|pусский|日本語|中文|한국어)/'
+]
+
+# All language patterns as one alternation, so a path is checked in a single search.
+# Each pattern is grouped so anchors and alternations inside it stay local.
+_NON_ENGLISH_RE = re.compile("|".join(f"(?:{pattern})" for pattern in _NON_ENGLISH_PATTERNS), re.IGNORECASE)
+
+# Language declared by <html lang="..."> and <meta http-equiv="content-language" content="...">
+_HTML_LANG_RE = re.compile(rb'<html\b[^>]*?\slang\s*=\s*["\']?([^"\'\s>]*)', re.IGNORECASE)
+_META_LANG_RE = re.compile(rb'<meta\b(?=[^>]*\shttp-equiv\s*=\s*["\']?content-language\b)[^>]*?\scontent\s*=\s*["\']?([^"\'\s>]*)', re.IGNORECASE)
+
+# How much of a page is searched for its language; these tags sit at the top,
+# the limit keeps large pages from being scanned to the end
+_LANG_SCAN_BYTES = 16384
+
+# Character encoding declared by <meta charset>, <meta http-equiv="content-type">
+# or an XML declaration, searched in the same leading part of the page
+_CHARSET_RE = re.compile(rb'<(?:meta\b[^>]*?\bcharset|\?xml\b[^>]*?\sencoding)\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+
+# Byte order marks and the encodings they mark, which take precedence over any
+# declared charset as in browsers
+_BOMS = ((b'\xef\xbb\xbf', 'utf-8'), (b'\xff\xfe', 'utf-16le'), (b'\xfe\xff', 'utf-16be'))
+
+# UTF-16 and UTF-32 labels. A page that declares one in its ASCII-compatible
+# markup isn't in it, browsers read it as UTF-8
+_WIDE_CHARSET_RE = re.compile(r'(?:utf|ucs)-?(?:16|32|2|4)')
+
+# Charset parameter of a Content-Type header
+_HEADER_CHARSET_RE = re.compile(r'charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+
+# Markdown image references: ![alt](url)
+_IMG_MD_RE = re.compile(r'!\[(.*?)\]\((.*?)\)')
+
+# Characters not allowed in downloaded image filenames
+_FILENAME_SANITIZE_RE = re.compile(r'[^\w.-]')
+
+# Image hosts whose URLs mark a page as a gallery page, REA Global by default
+# (realtor.com), and all of them as one pattern over the raw page bytes
+_GALLERY_DOMAINS = ('s1.rea.global',)
+_GALLERY_DOMAINS_RE = re.compile(b"|".join(re.escape(domain.encode()) for domain in _GALLERY_DOMAINS))
+
+# Image ID and extension at the end of a gallery image URL
+_IMG_ID_RE = re.compile(r'/([a-zA-Z0-9]+)\.(jpg|jpeg|png|webp)')
+
+# Size segment of a gallery image URL, like /raw/ or /1200x888-prop/
+_GALLERY_SIZE_RE = re.compile(r'/(?:raw|(\d+x\d+)-prop)/')
+
+# Browser user agent sent with every request to avoid being blocked
+_USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+# Responses that mean the server is busy or briefly failing, worth retrying
+_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Where the main content of a page is looked for in markdown export, in order
+_MAIN_CONTENT_XPATHS = (
+    '//main',
+    '//article',
+    '//div[contains(concat(" ", normalize-space(@class), " "), " content ")]',
+    '//body'
+)
+
+# Attribute holding the URL for each tag that links to pages or resources
+_LINK_ATTRS = {'a': 'href', 'link': 'href', 'script': 'src', 'img': 'src'}
+
+# Largest non-HTML body that is read anyway to keep its connection alive
+_DRAIN_MAX_BYTES = 65536
+
+# Number of images downloaded concurrently for each markdown page
+_IMAGE_WORKERS = 16
+
+# urlparse for the per-link hot paths: pages share most of their links, so
+# the same URLs are parsed over and over
+_urlparse = lru_cache(maxsize=4096)(urlparse)
+
+def is_valid_url(url, base_netloc):
+    """Check if URL belongs to the same domain, given as the netloc of the site's URL."""
+    parsed_url = _urlparse(url)
+    return parsed_url.netloc == base_netloc or not parsed_url.netloc
 
 def is_non_english_page(url, html_content=None):
     """
     Detect if a URL points to a non-English page.
     Uses URL patterns and HTML content analysis if available.
     """
-    parsed_url = urlparse(url)
+    parsed_url = _urlparse(url)
     path = parsed_url.path
     
-    # Common language path patterns
-    non_english_patterns = [
-        r'/[a-z]{2}(?:-[a-z]{2})?/', # language codes like /fr/, /es/, /zh-cn/
-        r'/[a-z]{2}(?:-[a-z]{2})?$', # language codes at the end of URL
-        r'/(?:translations|intl|i18n)/',
-        r'/(?:spanish|espanol|français|deutsch|italiano|português|pусский|日本語|中文|한국어)/'
-    ]
-    
     # Check URL path for language indicators
-    for pattern in non_english_patterns:
-        if re.search(pattern, path, re.IGNORECASE):
-            return True
+    if _NON_ENGLISH_RE.search(path):
+        return True
     
-    # If we have HTML content, check for language attributes
+    # If we have HTML content, check for language attributes in the document head
     if html_content:
-        soup = BeautifulSoup(html_content, 'html.parser')
-        
-        # Check html lang attribute
-        html_tag = soup.find('html')
-        if html_tag and html_tag.get('lang'):
-            lang = html_tag.get('lang').lower()
-            if lang and not lang.startswith(('en', 'en-')):
-                return True
+        head = html_content[:_LANG_SCAN_BYTES]
+        if isinstance(head, str):
+            head = head.encode('utf-8')
         
-        # Check hreflang and other language indicators
-        lang_meta = soup.find('meta', attrs={'http-equiv': 'content-language'})
-        if lang_meta and lang_meta.get('content'):
-            content_lang = lang_meta.get('content').lower()
-            if content_lang and not content_lang.startswith(('en', 'en-')):
-                return True
+        # Check html lang attribute, then the content-language meta tag
+        for pattern in (_HTML_LANG_RE, _META_LANG_RE):
+            match = pattern.search(head)
+            if match:
+                lang = match.group(1).decode('ascii', 'ignore').lower()
+                if lang and not lang.startswith('en'):
+                    return True
     
     return False
 
-def convert_to_relative_url(current_path, target_url, base_domain, output_dir):
-    """Convert an absolute URL to a relative path for local files."""
-    # Remove URL fragments
-    target_url, _ = urldefrag(target_url)
-    
-    # Skip non-HTTP URLs (mailto:, tel:, etc.)
-    if not target_url.startswith(('http://', 'https://')):
-        return target_url
-    
-    # If the URL is to an external domain, keep it as is
-    parsed_url = urlparse(target_url)
-    parsed_base = urlparse(base_domain)
-    if parsed_url.netloc and parsed_url.netloc != parsed_base.netloc:
-        return target_url
-    
-    # Get the path of the target URL
-    target_path = parsed_url.path
-    if not target_path or target_path.endswith('/'):
-        target_path += 'index.html'
-    target_path = target_path.lstrip('/')
-    if not target_path:
-        target_path = 'index.html'
-    
-    # Get current file directory
-    current_dir = os.path.dirname(current_path)
-    
-    # Calculate relative path
-    # First, get paths relative to output directory
-    target_abs_path = os.path.join(output_dir, target_path)
-    current_abs_path = os.path.join(output_dir, current_path)
-    
-    # Then calculate relative path from current file to target file
-    rel_path = os.path.relpath(target_abs_path, os.path.dirname(current_abs_path))
-    
-    # Add query params and fragments back if they exist
-    if parsed_url.query:
-        rel_path += f"?{parsed_url.query}"
-    if parsed_url.fragment:
-        rel_path += f"#{parsed_url.fragment}"
-    
-    return rel_path
-
-def html_to_markdown(html_content, base_url, img_dir=None):
+@lru_cache(maxsize=4096)
+def _relpath(path, start):
+    """Memoized os.path.relpath, pages link to the same targets over and over."""
+    return os.path.relpath(path, start)
+
+def make_url_rewriter(current_path, base_netloc, output_dir):
+    """
+    Build a function converting absolute URLs to relative paths for local files,
+    as seen from the page saved at current_path.
+    """
+    # The directory of the current page is the same for every link on it
+    current_dir_abs = os.path.dirname(os.path.join(output_dir, current_path))
+    
+    # Navigation and footer links repeat the same targets many times per page
+    @lru_cache(maxsize=512)
+    def rewrite(target_url):
+        # Remove URL fragments
+        target_url, _ = urldefrag(target_url)
+        
+        # Skip non-HTTP URLs (mailto:, tel:, etc.)
+        if not target_url.startswith(_HTTP_SCHEMES):
+            return target_url
+        
+        # If the URL is to an external domain, keep it as is
+        parsed_url = _urlparse(target_url)
+        if parsed_url.netloc and parsed_url.netloc != base_netloc:
+            return target_url
+        
+        # Get the path of the target URL
+        target_path = parsed_url.path
+        if not target_path or target_path.endswith('/'):
+            target_path += 'index.html'
+        target_path = target_path.lstrip('/')
+        if not target_path:
+            target_path = 'index.html'
+        
+        # Calculate relative path from current file to target file
+        rel_path = _relpath(os.path.join(output_dir, target_path), current_dir_abs)
+        
+        # Add query params and fragments back if they exist
+        if parsed_url.query:
+            rel_path += f"?{parsed_url.query}"
+        if parsed_url.fragment:
+            rel_path += f"#{parsed_url.fragment}"
+        
+        return rel_path
+    
+    return rewrite
+
+def rewrite_links(doc, current_url, current_path, base_netloc, output_dir):
+    """Rewrite links, images, stylesheets and scripts in a parsed page to relative local paths."""
+    to_relative = make_url_rewriter(current_path, base_netloc, output_dir)
+    
+    # Update links (a href), images (img src), CSS links (link href) and
+    # script sources (script src) in a single pass over the tree
+    for element in doc.iter(*_LINK_ATTRS):
+        attr = _LINK_ATTRS[element.tag]
+        value = element.get(attr)
+        if not value:
+            continue
+        if element.tag == 'a' and value.startswith('#'):  # Skip anchor links
+            continue
+        absolute_url = urljoin(current_url, value)
+        element.set(attr, to_relative(absolute_url))
+
+@lru_cache(maxsize=None)
+def _html_parser(encoding):
+    """lxml HTML parser for one encoding, not adding a doctype the page lacks."""
+    return lxml.html.HTMLParser(encoding=encoding, default_doctype=False)
+
+def parse_html(html_content, http_encoding=None):
+    """
+    Parse page bytes with lxml.
+    The page is read in the encoding of its byte order mark, else in the
+    charset of its Content-Type header (http_encoding), else in the one the
+    page declares, else as UTF-8, or as Windows-1252 if it isn't valid UTF-8.
+    Returns the document and the encoding to save it in: the one the page
+    declares, so the declaration stays true, or UTF-8.
+    """
+    bom_encoding = next((name for bom, name in _BOMS if html_content.startswith(bom)), None)
+    
+    match = _CHARSET_RE.search(html_content, 0, _LANG_SCAN_BYTES)
+    declared = match.group(1).decode('ascii').lower() if match else None
+    if declared and _WIDE_CHARSET_RE.match(declared):
+        declared = 'utf-8'
+    
+    # Use the first encoding lxml knows
+    parser = None
+    encoding = 'utf-8'
+    for candidate in (bom_encoding, http_encoding, declared):
+        if not candidate:
+            continue
+        try:
+            candidate_parser = _html_parser(candidate)
+        except LookupError:
+            continue
+        if parser is None:
+            parser = candidate_parser
+        if candidate == declared:
+            encoding = declared
+    
+    # Undeclared pages that aren't UTF-8 are read as legacy Western text
+    if parser is None:
+        try:
+            html_content.decode('utf-8')
+            parser = _html_parser('utf-8')
+        except UnicodeDecodeError:
+            parser = _html_parser('windows-1252')
+    
+    try:
+        doc = lxml.html.document_fromstring(html_content, parser=parser)
+    except etree.ParserError:
+        # Empty page
+        doc = lxml.html.document_fromstring(b'<html></html>', parser=parser)
+    
+    return doc, encoding
+
+def save_response(response, path):
+    """
+    Stream a response body to a file in chunks instead of holding it in memory.
+    The body goes to a temporary .part file that is renamed into place once
+    complete, so an interrupted transfer never leaves a truncated file at path.
+    """
+    part_path = path + '.part'
+    try:
+        with open(part_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=65536):
+                f.write(chunk)
+        os.replace(part_path, path)
+    except Exception:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+
+def index_images(img_dir):
+    """Map the URL digest of each image saved in img_dir to its filename."""
+    saved_images = {}
+    if os.path.isdir(img_dir):
+        for entry in os.scandir(img_dir):
+            # Filenames look like img_{16 hex digit digest}_{name}
+            name = entry.name
+            if name.startswith('img_') and name[20:21] == '_' and not name.endswith('.part'):
+                saved_images[name[4:20]] = name
+    return saved_images
+
+def download_image(session, img_url, img_dir, saved_images=None):
+    """
+    Download an image into img_dir and return its filename, or None on failure.
+    Images are named after a stable digest of their URL, so files saved by a
+    previous run are reused instead of downloaded again. saved_images is the
+    index_images() map of img_dir, kept up to date here; it is built if not given.
+    """
+    if saved_images is None:
+        saved_images = index_images(img_dir)
+    img_id = hashlib.blake2b(img_url.encode(), digest_size=8).hexdigest()
+    if img_id in saved_images:
+        return saved_images[img_id]
+    
+    try:
+        # Download the image
+        with session.get(img_url, timeout=10, stream=True) as response:
+            if response.status_code != 200:
+                return None
+            
+            # Get image file extension
+            content_type = response.headers.get('Content-Type', '')
+            ext = content_type.split('/')[-1].split(';')[0].strip()
+            if not ext or ext == 'jpeg':
+                ext = 'jpg'
+            
+            # Create a unique filename
+            img_filename = f"img_{img_id}_{os.path.basename(urlparse(img_url).path)}"
+            img_filename = _FILENAME_SANITIZE_RE.sub('_', img_filename)
+            if not img_filename.endswith(f'.{ext}'):
+                img_filename += f'.{ext}'
+            
+            # Save the image
+            img_path = os.path.join(img_dir, img_filename)
+            save_response(response, img_path)
+        
+        saved_images[img_id] = img_filename
+        return img_filename
+    except Exception as e:
+        return None
+
+def html_to_markdown(html_content, base_url, img_dir=None, image_cache=None, session=None, saved_images=None):
     """
     Convert HTML content to Markdown.
     If img_dir is provided, images will be downloaded and embedded.
+    If image_cache is provided, it maps image URLs to their saved filenames so
+    images shared between pages are only downloaded once.
+    saved_images is the index_images() map of img_dir, built if not given.
     """
+    if image_cache is None:
+        image_cache = {}
+    
     # Configure the converter
     converter = html2text.HTML2Text()
     converter.ignore_links = False
@@ -120,131 +347,84 @@ def html_to_markdown(html_content, base_url, img_dir=None):
     
     # If img_dir is provided, download and embed images
     if img_dir:
-        # Find all image references in markdown
-        img_pattern = r'!\[(.*?)\]\((.*?)\)'
-        
-        def download_and_update_image(match):
-            alt_text = match.group(1)
-            img_url = match.group(2)
-            
+        def absolute_image_url(img_url):
             # Make URL absolute if it's relative
-            if not img_url.startswith(('http://', 'https://')):
+            if not img_url.startswith(_HTTP_SCHEMES):
                 img_url = urljoin(base_url, img_url)
-            
+            return img_url
+        
+        # Find all image references, skipping images already downloaded for another page
+        img_urls = {absolute_image_url(match.group(2)) for match in _IMG_MD_RE.finditer(markdown)}
+        new_img_urls = [img_url for img_url in img_urls if img_url not in image_cache]
+        
+        # Download the new images concurrently
+        if new_img_urls:
+            os.makedirs(img_dir, exist_ok=True)
+            if saved_images is None:
+                saved_images = index_images(img_dir)
+            # Without a session from the caller, use one just for these images
+            own_session = session is None
+            if own_session:
+                session = create_session(_IMAGE_WORKERS)
             try:
-                # Download the image
-                response = requests.get(img_url, timeout=10)
-                if response.status_code == 200:
-                    # Get image file extension
-                    content_type = response.headers.get('Content-Type', '')
-                    ext = content_type.split('/')[-1].split(';')[0].strip()
-                    if not ext or ext == 'jpeg':
-                        ext = 'jpg'
-                    
-                    # Create a unique filename
-                    img_filename = f"img_{hash(img_url) % 10000000}_{os.path.basename(urlparse(img_url).path)}"
-                    img_filename = re.sub(r'[^\w.-]', '_', img_filename)
-                    if not img_filename.endswith(f'.{ext}'):
-                        img_filename += f'.{ext}'
-                    
-                    # Save the image
-                    img_path = os.path.join(img_dir, img_filename)
-                    os.makedirs(os.path.dirname(img_path), exist_ok=True)
-                    
-                    with open(img_path, 'wb') as f:
-                        f.write(response.content)
-                    
-                    # Return updated markdown
-                    return f'![{alt_text}](images/{img_filename})'
-                else:
-                    # Return original if failed
-                    return match.group(0)
-            except Exception as e:
-                # Return original on error
-                return match.group(0)
+                with ThreadPoolExecutor(max_workers=_IMAGE_WORKERS) as executor:
+                    filenames = executor.map(lambda img_url: download_image(session, img_url, img_dir, saved_images),
+                                             new_img_urls)
+                    for img_url, img_filename in zip(new_img_urls, filenames):
+                        if img_filename:
+                            image_cache[img_url] = img_filename
+            finally:
+                if own_session:
+                    session.close()
+        
+        def update_image(match):
+            img_url = absolute_image_url(match.group(2))
+            if img_url in image_cache:
+                return f'![{match.group(1)}](images/{image_cache[img_url]})'
+            # Keep the original reference if the download failed
+            return match.group(0)
         
         # Replace all image references
-        markdown = re.sub(img_pattern, download_and_update_image, markdown)
+        markdown = _IMG_MD_RE.sub(update_image, markdown)
     
     return markdown
 
+@lru_cache(maxsize=32)
+def _gallery_image_re(domain, as_bytes=False):
+    """
+    Compiled regex for gallery image IDs, built once per domain, for str or
+    bytes content. Matches image URLs in JSON fields (groups 1-2) and any image
+    URL on the domain, as found in img src, srcset and scripts (groups 3-4).
+    """
+    pattern = (
+        r'"(?:mediaUrl|url|src|originalUrl|hero|large)":"[^"]*?/([\w\d]+)\.(jpg|jpeg|png|webp)[^"]*"'
+        fr'|(?:https?:)?//{re.escape(domain)}/[^"\'\s]*?/([a-zA-Z0-9]+)\.(jpg|jpeg|png|webp)'
+    )
+    return re.compile(pattern.encode() if as_bytes else pattern)
+
 def extract_image_ids(html_content, domain_patterns=None):
-    """Extract image IDs from HTML content for gallery downloading."""
+    """
+    Extract image IDs from HTML content for gallery downloading.
+    The content can be the raw page bytes, which saves decoding the page.
+    """
     if domain_patterns is None:
-        # Default patterns for REA Global (realtor.com)
-        domain_patterns = ['s1.rea.global']
-    
-    # Use BeautifulSoup to parse HTML
-    soup = BeautifulSoup(html_content, 'html.parser')
+        domain_patterns = _GALLERY_DOMAINS
+    as_bytes = isinstance(html_content, bytes)
     
     # Image IDs we've found with their extensions
     image_ids = set()
     
     # Check for domain patterns in the HTML
     for domain in domain_patterns:
-        if domain not in html_content:
+        if (domain.encode() if as_bytes else domain) not in html_content:
             continue
-            
-        # Look for image URLs in img tags
-        for img in soup.find_all('img'):
-            src = img.get('src', '')
-            if domain in src:
-                # Extract image ID from the URL
-                match = re.search(r'/([a-zA-Z0-9]+)\.(jpg|jpeg|png|webp)', src)
-                if match:
-                    image_id = match.group(1)
-                    ext = match.group(2)
-                    image_ids.add((image_id, ext))
-        
-        # Look for image URLs in srcset attributes
-        for tag in soup.find_all(['img', 'source']):
-            srcset = tag.get('srcset', '')
-            if domain in srcset:
-                for src_str in srcset.split(','):
-                    if domain in src_str:
-                        # Extract URL from srcset
-                        url_part = src_str.strip().split(' ')[0]
-                        match = re.search(r'/([a-zA-Z0-9]+)\.(jpg|jpeg|png|webp)', url_part)
-                        if match:
-                            image_id = match.group(1)
-                            ext = match.group(2)
-                            image_ids.add((image_id, ext))
         
-        # Look for image URLs in JavaScript/JSON
-        script_pattern = fr'https?://{re.escape(domain)}/[^"\']+/([a-zA-Z0-9]+)\.(jpg|jpeg|png|webp)'
-        for script in soup.find_all('script'):
-            script_content = script.string
-            if script_content and domain in script_content:
-                matches = re.findall(script_pattern, script_content)
-                for match in matches:
-                    image_id = match[0]
-                    ext = match[1]
-                    image_ids.add((image_id, ext))
-        
-        # Also search the raw HTML for any missed IDs
-        raw_pattern = fr'https?://{re.escape(domain)}/[^"\']+/([a-zA-Z0-9]+)\.(jpg|jpeg|png|webp)'
-        matches = re.findall(raw_pattern, html_content)
-        for match in matches:
-            image_id = match[0]
-            ext = match[1]
-            image_ids.add((image_id, ext))
-        
-        # Search for specific image ID patterns in JSON data
-        json_patterns = [
-            r'"mediaUrl":"[^"]*/([\w\d]+)\.(jpg|jpeg|png|webp)[^"]*"',
-            r'"url":"[^"]*/([\w\d]+)\.(jpg|jpeg|png|webp)[^"]*"',
-            r'"src":"[^"]*/([\w\d]+)\.(jpg|jpeg|png|webp)[^"]*"',
-            r'"originalUrl":"[^"]*/([\w\d]+)\.(jpg|jpeg|png|webp)[^"]*"',
-            r'"hero":"[^"]*/([\w\d]+)\.(jpg|jpeg|png|webp)[^"]*"',
-            r'"large":"[^"]*/([\w\d]+)\.(jpg|jpeg|png|webp)[^"]*"'
-        ]
-        
-        for pattern in json_patterns:
-            matches = re.findall(pattern, html_content)
-            for match in matches:
-                image_id = match[0]
-                ext = match[1]
-                image_ids.add((image_id, ext))
+        # Find image URLs in tags, scripts and JSON data in a single pass
+        for match in _gallery_image_re(domain, as_bytes).finditer(html_content):
+            found = match.group(1, 2) if match.group(1) else match.group(3, 4)
+            if as_bytes:
+                found = tuple(part.decode('ascii') for part in found)
+            image_ids.add(found)
     
     return list(image_ids)
 
@@ -280,13 +460,14 @@ def generate_gallery_urls(image_ids, domain, country_code="cr"):
     
     return urls
 
-def download_gallery_images(urls, output_dir, max_per_image=1):
+def download_gallery_images(urls, output_dir, max_per_image=1, session=None):
     """
     Download gallery images from a list of URLs.
     Args:
         urls: List of image URLs to download
         output_dir: Directory to save images
         max_per_image: Maximum number of sizes to download per unique image ID
+        session: requests session to reuse connections from (default: a new session)
     """
     if not urls:
         return []
@@ -295,18 +476,16 @@ def download_gallery_images(urls, output_dir, max_per_image=1):
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
     
-    # Set user agent to avoid being blocked
+    # The session sends the user agent, the image host also wants a referer
     headers = {
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
         'Referer': 'https://www.realtor.com/'
     }
     
     # Group URLs by image ID to avoid downloading multiple sizes of the same image
-    image_id_pattern = r'/([a-zA-Z0-9]+)\.(jpg|jpeg|png|webp)'
     image_id_to_urls = {}
     
     for url in urls:
-        match = re.search(image_id_pattern, url)
+        match = _IMG_ID_RE.search(url)
         if match:
             image_id = match.group(1)
             if image_id not in image_id_to_urls:
@@ -321,39 +500,301 @@ def download_gallery_images(urls, output_dir, max_per_image=1):
                                       2 if "828x612" in u else 
                                       3))
     
-    # Download images
-    downloaded_images = []
-    downloaded_ids = set()
-    
+    # Collect the files to download, only up to max_per_image sizes of each image
+    tasks = []
     for image_id, image_urls in image_id_to_urls.items():
-        # Only download up to max_per_image sizes of each image
-        for i, url in enumerate(image_urls[:max_per_image]):
-            try:
-                # Extract size/format from URL for filename
-                size_match = re.search(r'/(?:raw|(\d+x\d+)-prop)/', url)
-                size = size_match.group(1) if size_match and size_match.group(1) else "raw"
-                
-                # Create filename
-                filename = f"gallery_{image_id}_{size}.{url.split('.')[-1]}"
-                filepath = os.path.join(output_dir, filename)
-                
-                # Download the image
-                response = requests.get(url, headers=headers, timeout=10)
-                if response.status_code == 200:
-                    with open(filepath, 'wb') as f:
-                        f.write(response.content)
-                    print(f"Downloaded gallery image: {filename}")
-                    downloaded_images.append(filepath)
-                    downloaded_ids.add(image_id)
-                else:
+        for url in image_urls[:max_per_image]:
+            # Extract size/format from URL for filename
+            size_match = _GALLERY_SIZE_RE.search(url)
+            size = size_match.group(1) if size_match and size_match.group(1) else "raw"
+            
+            # Create filename
+            filename = f"gallery_{image_id}_{size}.{url.split('.')[-1]}"
+            tasks.append((image_id, url, os.path.join(output_dir, filename)))
+    
+    def download_one(task):
+        image_id, url, filepath = task
+        try:
+            with session.get(url, headers=headers, timeout=10, stream=True) as response:
+                if response.status_code != 200:
                     print(f"Failed to download: {url} (Status: {response.status_code})")
-            except Exception as e:
-                print(f"Error downloading {url}: {e}")
+                    return False
+                save_response(response, filepath)
+            print(f"Downloaded gallery image: {os.path.basename(filepath)}")
+            return True
+        except Exception as e:
+            print(f"Error downloading {url}: {e}")
+            return False
+    
+    # Download images concurrently, without a session from the caller use one
+    # just for these images
+    own_session = session is None
+    if own_session:
+        session = create_session(_IMAGE_WORKERS)
+    try:
+        with ThreadPoolExecutor(max_workers=_IMAGE_WORKERS) as executor:
+            results = list(executor.map(download_one, tasks))
+    finally:
+        if own_session:
+            session.close()
+    
+    downloaded_images = [filepath for (_, _, filepath), ok in zip(tasks, results) if ok]
+    downloaded_ids = {image_id for (image_id, _, _), ok in zip(tasks, results) if ok}
     
     print(f"Downloaded {len(downloaded_images)} gallery images ({len(downloaded_ids)} unique images)")
     return downloaded_images
 
-def download_website(url, output_dir=None, delay=0.5, english_only=False, markdown_export=False, page_only=False, gallery_mode=False, country_code="cr"):
+def parse_and_rewrite(html_content, current_url, current_path, base_netloc, output_dir, english_only=False, markdown_export=False, save=True, http_encoding=None):
+    """
+    Parse a downloaded page and extract everything the crawler needs from it.
+    Unless markdown_export is set, the page is also saved under output_dir with
+    links rewritten to relative local paths (only if save is True).
+    http_encoding is the charset from the response's Content-Type header, if any.
+    Runs in a worker process, so it only takes and returns picklable values.
+    
+    Returns a dict with:
+        non_english: True if english_only is set and the page is not in English
+        title: Page title
+        urls: (absolute URL, is_link) pairs for same-domain links (a href) and
+              resources (link href, script src, img src) in document order
+        main_content: HTML of the main content area (markdown export only)
+        file_path: Where the page was saved (HTML download only)
+        save_error: Error message if saving the page failed
+    """
+    page = {
+        'non_english': english_only and is_non_english_page(current_url, html_content),
+        'title': None,
+        'urls': [],
+        'main_content': None,
+        'file_path': None,
+        'save_error': None
+    }
+    
+    # Skipped pages don't need to be parsed
+    if page['non_english']:
+        return page
+    
+    # Parse HTML content once, the same tree is used for every step below
+    doc, encoding = parse_html(html_content, http_encoding)
+    title = doc.find('.//title')
+    page['title'] = title.text if title is not None and title.text else os.path.basename(current_url)
+    
+    # Extract links and resources in a single pass
+    for element in doc.iter(*_LINK_ATTRS):
+        value = element.get(_LINK_ATTRS[element.tag])
+        if not value:
+            continue
+        absolute_url = urljoin(current_url, value)
+        
+        # Only follow links that belong to the same domain
+        if is_valid_url(absolute_url, base_netloc):
+            page['urls'].append((absolute_url, element.tag == 'a'))
+    
+    if markdown_export:
+        # Extract main content area if possible, or use the whole page
+        main_content = doc
+        for xpath in _MAIN_CONTENT_XPATHS:
+            found = doc.xpath(xpath)
+            if found:
+                main_content = found[0]
+                break
+        page['main_content'] = etree.tostring(main_content, method='html', encoding='unicode', with_tail=False)
+    elif save:
+        # Rewrite links now that link discovery is done with the tree, and save
+        # the page here so file writes happen in the workers too
+        page['file_path'] = os.path.join(output_dir, current_path)
+        part_path = None
+        try:
+            rewrite_links(doc, current_url, current_path, base_netloc, output_dir)
+            # The doctype and comments around the root come with the tree.
+            # Several URLs can map to the same file (query strings, fragments)
+            # and be parsed at once in different workers, so each worker writes
+            # its own temporary file and renames it into place
+            part_path = f"{page['file_path']}.{os.getpid()}.part"
+            try:
+                f = open(part_path, 'wb')
+            except FileNotFoundError:
+                # Only create the directory when it is missing, which saves a
+                # makedirs per page
+                os.makedirs(os.path.dirname(part_path), exist_ok=True)
+                f = open(part_path, 'wb')
+            with f:
+                f.write(etree.tostring(doc.getroottree(), method='html', encoding=encoding))
+            os.replace(part_path, page['file_path'])
+        except Exception as e:
+            page['save_error'] = str(e)
+            if part_path and os.path.exists(part_path):
+                os.remove(part_path)
+    
+    return page
+
+def create_session(pool_size=16):
+    """
+    Create a requests session with a keep-alive connection pool of the given
+    size and a browser user agent. Failed connections and busy or failing
+    servers are retried with a short backoff, honoring Retry-After; when the
+    retries run out the last response is returned as is.
+    """
+    session = requests.Session()
+    session.headers['User-Agent'] = _USER_AGENT
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=pool_size,
+                          max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=_RETRY_STATUSES,
+                                            raise_on_status=False))
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+class HostRateLimiter:
+    """
+    Per-host token bucket shared by the download threads.
+    Each host earns one request every `delay` seconds and can save up to
+    `burst` of them, so up to `burst` requests start together while over time
+    a host gets no more requests than a serial crawl would send.
+    """
+    def __init__(self, delay, burst=1):
+        self.delay = delay
+        self.burst = burst
+        # Host -> (tokens left, time they were counted)
+        self.buckets = {}
+        self.lock = threading.Lock()
+    
+    def wait(self, url):
+        """Block until the host of the given URL may be requested again."""
+        if self.delay <= 0:
+            return
+        
+        host = urlparse(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            tokens, counted = self.buckets.get(host, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - counted) / self.delay) - 1
+            self.buckets[host] = (tokens, now)
+        
+        # A negative balance reserves a later slot, wait until it comes
+        if tokens < 0:
+            time.sleep(-tokens * self.delay)
+
+class CrawlState:
+    """
+    Crawl progress kept in an SQLite database in the output directory.
+    Holds every URL seen, which of them are finished, and the markdown sections
+    and gallery image IDs found so far. The frontier is read from the database
+    in the order URLs were found. Memory stays flat on large sites, and an
+    interrupted crawl can be resumed where it stopped.
+    Only used from the main thread.
+    """
+    def __init__(self, path, resume=False):
+        self.path = path
+        if not resume:
+            self.remove_files()
+        
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        # visited is NULL while a URL waits to be fetched, 1 once it is done,
+        # and 0 for links that are remembered but never fetched. is_link tells
+        # links to pages from resources (stylesheets, scripts, images)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, visited INTEGER, is_link INTEGER)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS sections (part INTEGER PRIMARY KEY, url TEXT, title TEXT)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS gallery_ids (image_id TEXT, ext TEXT, PRIMARY KEY (image_id, ext))")
+        self.conn.commit()
+        
+        # Row of the last URL handed out, unfinished URLs from an earlier run
+        # are all behind it again
+        self.last_rowid = 0
+    
+    def remove_files(self):
+        """Delete the database and its WAL files."""
+        for suffix in ('', '-wal', '-shm'):
+            try:
+                os.remove(self.path + suffix)
+            except FileNotFoundError:
+                pass
+    
+    def add_urls(self, urls, visited=None):
+        """
+        Queue (URL, is_link) pairs that haven't been seen, or just remember
+        them if visited is 0.
+        """
+        self.conn.executemany("INSERT OR IGNORE INTO urls (url, visited, is_link) VALUES (?, ?, ?)",
+                              ((url, visited, is_link) for url, is_link in urls))
+    
+    def next_urls(self, limit):
+        """Take up to limit (URL, is_link) pairs waiting to be fetched."""
+        rows = self.conn.execute(
+            "SELECT rowid, url, is_link FROM urls WHERE rowid > ? AND visited IS NULL ORDER BY rowid LIMIT ?",
+            (self.last_rowid, limit)
+        ).fetchall()
+        if rows:
+            self.last_rowid = rows[-1][0]
+        return [(url, bool(is_link)) for _, url, is_link in rows]
+    
+    def visit(self, url):
+        """Mark a URL as done."""
+        self.conn.execute("UPDATE urls SET visited = 1 WHERE url = ?", (url,))
+    
+    def visited_urls(self):
+        """Done URLs in the order they were found."""
+        return (url for url, in self.conn.execute("SELECT url FROM urls WHERE visited = 1 ORDER BY rowid"))
+    
+    def visited_count(self):
+        """Number of done URLs."""
+        return self.conn.execute("SELECT count(*) FROM urls WHERE visited = 1").fetchone()[0]
+    
+    def add_section(self, url, title):
+        """Record a markdown section, returning the part number to save it under."""
+        return self.conn.execute("INSERT INTO sections (url, title) VALUES (?, ?)", (url, title)).lastrowid
+    
+    def sections(self, root_url):
+        """(part, url, title) of each section, homepage first, then by title and URL."""
+        return self.conn.execute(
+            "SELECT part, url, title FROM sections ORDER BY url != ?, title, url", (root_url,)
+        ).fetchall()
+    
+    def add_gallery_ids(self, image_ids):
+        """Record (image ID, extension) pairs found on a gallery page."""
+        self.conn.executemany("INSERT OR IGNORE INTO gallery_ids (image_id, ext) VALUES (?, ?)", image_ids)
+    
+    def gallery_ids(self):
+        """(image ID, extension) pairs in the order they were found."""
+        return self.conn.execute("SELECT image_id, ext FROM gallery_ids ORDER BY rowid").fetchall()
+    
+    def commit(self):
+        """Save the changes made since the last commit."""
+        self.conn.commit()
+    
+    def close(self, remove=False):
+        """Close the database, deleting it if the crawl is complete."""
+        self.conn.close()
+        if remove:
+            self.remove_files()
+
+def fetch_url(session, rate_limiter, url, is_link=True):
+    """
+    Fetch a URL with the shared session, once the rate limiter allows it for
+    links to pages. Resources (stylesheets, scripts, images) are not held back,
+    like a serial crawl that only pauses after each page.
+    Only HTML bodies are downloaded, other responses just carry their headers.
+    """
+    if is_link:
+        rate_limiter.wait(url)
+    response = session.get(url, timeout=10, stream=True)
+    
+    content_type = response.headers.get('Content-Type', '')
+    if 'text/html' in content_type.lower():
+        # Read the page here, in the download thread
+        response.content
+    else:
+        # Only pages are saved, so skip the body. Small bodies are still read
+        # so the connection goes back to the pool instead of being dropped
+        length = response.headers.get('Content-Length', '')
+        if length.isdigit() and int(length) <= _DRAIN_MAX_BYTES:
+            response.content
+        response.close()
+    
+    return response
+
+def download_website(url, output_dir=None, delay=0.5, english_only=False, markdown_export=False, page_only=False, gallery_mode=False, country_code="cr", workers=8, resume=False):
     """
     Download all URLs from a website.
     
@@ -366,8 +807,10 @@ def download_website(url, output_dir=None, delay=0.5, english_only=False, markdo
         page_only: If True, download only the specified page and its resources without following links
         gallery_mode: If True, attempt to extract and download high-quality gallery images
         country_code: Country code for gallery image URLs (default: cr for Costa Rica)
+        workers: Number of requests to keep in flight at the same time
+        resume: If True, continue an interrupted crawl into the same output directory
     """
-    if not url.startswith(('http://', 'https://')):
+    if not url.startswith(_HTTP_SCHEMES):
         url = 'https://' + url
     
     # Create output directory based on domain if not specified
@@ -379,12 +822,16 @@ def download_website(url, output_dir=None, delay=0.5, english_only=False, markdo
         os.makedirs(output_dir)
         print(f"Created output directory: {output_dir}")
     
-    # Create images directory for markdown export
+    # Create images directory for markdown export, and a directory holding each
+    # page's markdown until the final file is assembled
     img_dir = None
+    md_parts_dir = None
     if markdown_export:
         img_dir = os.path.join(output_dir, 'images')
         os.makedirs(img_dir, exist_ok=True)
         print(f"Created images directory: {img_dir}")
+        md_parts_dir = os.path.join(output_dir, '.md_parts')
+        os.makedirs(md_parts_dir, exist_ok=True)
     
     # Create gallery directory if in gallery mode
     gallery_dir = None
@@ -393,19 +840,18 @@ def download_website(url, output_dir=None, delay=0.5, english_only=False, markdo
         os.makedirs(gallery_dir, exist_ok=True)
         print(f"Created gallery directory: {gallery_dir}")
     
-    # Keep track of visited URLs to avoid duplicates
-    visited_urls = set()
-    urls_to_visit = [url]
-    base_domain = url
-    
-    # Dictionary to keep track of URLs and their local file paths
-    url_to_local_path = {}
+    # Keep track of queued and visited URLs, markdown sections and gallery
+    # image IDs on disk. The database is removed once the crawl completes
+    state = CrawlState(os.path.join(output_dir, '.crawl.sqlite'), resume)
+    state.add_urls([(url, True)])
+    state.commit()
+    # Domain of the site, links elsewhere are not followed
+    base_netloc = urlparse(url).netloc
     
-    # For markdown export, keep track of content
-    markdown_content = []
-    
-    # For gallery mode, keep track of image IDs
-    gallery_image_ids = []
+    # For markdown export, keep track of images already downloaded, and of the
+    # ones saved by an earlier run, indexed once instead of per image
+    image_cache = {}
+    saved_images = index_images(img_dir) if markdown_export else None
     
     # Statistics
     stats = {
@@ -426,220 +872,231 @@ def download_website(url, output_dir=None, delay=0.5, english_only=False, markdo
         print("Page-only mode enabled: Only downloading the specified page and its resources")
     if gallery_mode:
         print("Gallery mode enabled: Attempting to extract and download gallery images")
+    if resume:
+        print("Resuming the previous crawl into this directory")
     
-    while urls_to_visit:
-        current_url = urls_to_visit.pop(0)
-        
-        if current_url in visited_urls:
-            continue
-        
-        visited_urls.add(current_url)
-        print(f"Processing: {current_url}")
+    # Share one session for pages, images and gallery downloads so connections
+    # are kept alive and reused. The pool holds a connection per page and image
+    # worker, otherwise connections beyond the pool size are discarded after
+    # each request and need a new handshake.
+    session = create_session(workers + _IMAGE_WORKERS)
+    
+    # Space out requests to each host to avoid overwhelming the server, letting
+    # each worker start a request right away
+    rate_limiter = HostRateLimiter(delay, workers)
+    
+    # Pages are downloaded by threads, then parsed and rewritten in worker
+    # processes so parsing is not serialized by the GIL. The workers are not
+    # forked from this process, which already runs the download threads by the
+    # time the first page is parsed, and pages arrive too slowly to need more
+    # parsers than download threads. Python 3.6 has no mp_context argument and
+    # keeps the platform default
+    pool_options = {'max_workers': min(workers, os.cpu_count() or 1)}
+    if sys.version_info >= (3, 7):
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            pool_options['mp_context'] = multiprocessing.get_context('forkserver')
+        else:
+            pool_options['mp_context'] = multiprocessing.get_context('spawn')
+    with ThreadPoolExecutor(max_workers=workers) as executor, \
+         ProcessPoolExecutor(**pool_options) as parser_pool:
+        # In-flight downloads, mapped to the URL they are fetching
+        fetches = {}
+        # In-flight page parses, mapped to the URL, response and local path of the page
+        parses = {}
         
-        try:
-            response = requests.get(current_url, timeout=10)
+        while True:
+            # Keep up to `workers` requests in flight
+            for current_url, is_link in state.next_urls(workers - len(fetches)):
+                print(f"Processing: {current_url}")
+                future = executor.submit(fetch_url, session, rate_limiter, current_url, is_link)
+                fetches[future] = current_url
             
-            # Skip if not HTML content
-            content_type = response.headers.get('Content-Type', '')
-            if 'text/html' not in content_type.lower():
-                continue
+            if not fetches and not parses:
+                break
             
-            # Check if this is a non-English page and we're in english_only mode
-            if english_only and is_non_english_page(current_url, response.text):
-                print(f"Skipping non-English page: {current_url}")
-                stats['skipped_non_english'] += 1
-                continue
-                
-            if response.status_code == 200:
-                # Parse HTML content
-                soup = BeautifulSoup(response.text, 'html.parser')
-                
-                # Extract title
-                title = soup.title.string if soup.title else os.path.basename(current_url)
-                
-                # Create a file path for this URL
-                parsed_url = urlparse(current_url)
-                path = parsed_url.path
-                if not path or path.endswith('/'):
-                    path += 'index.html'
-                    
-                # Clean up path for filename
-                path = path.lstrip('/')
-                if not path:
-                    path = 'index.html'
-                
-                # Store URL to local path mapping
-                url_to_local_path[current_url] = path
-                
-                # If in gallery mode, extract image IDs
-                if gallery_mode:
-                    # Check if this is likely a gallery page (realtor.com or similar)
-                    domain = urlparse(current_url).netloc
-                    if 'realtor.com' in domain or any(pattern in response.text for pattern in ['s1.rea.global']):
-                        print("Detected possible gallery page, extracting image IDs...")
-                        ids = extract_image_ids(response.text)
-                        if ids:
-                            gallery_image_ids.extend(ids)
-                            print(f"Found {len(ids)} gallery image IDs")
+            done, _ = wait(list(fetches) + list(parses), return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in fetches:
+                    current_url = fetches.pop(future)
+                    try:
+                        response = future.result()
+                        
+                        # Skip if not HTML content
+                        content_type = response.headers.get('Content-Type', '')
+                        if 'text/html' not in content_type.lower():
+                            state.visit(current_url)
+                            continue
+                        
+                        # Create a file path for this URL
+                        parsed_url = urlparse(current_url)
+                        path = parsed_url.path
+                        if not path or path.endswith('/'):
+                            path += 'index.html'
+                            
+                        # Clean up path for filename
+                        path = path.lstrip('/')
+                        if not path:
+                            path = 'index.html'
+                        
+                        # The header charset takes precedence over the one in the page.
+                        # requests' ISO-8859-1 default for text/* is not used
+                        charset = _HEADER_CHARSET_RE.search(content_type)
+                        http_encoding = charset.group(1).lower() if charset else None
+                        
+                        # Hand the page over to a worker process
+                        parse_future = parser_pool.submit(parse_and_rewrite, response.content, current_url, path,
+                                                          base_netloc, output_dir, english_only, markdown_export,
+                                                          response.status_code == 200, http_encoding)
+                        parses[parse_future] = (current_url, response, path)
+                    except Exception as e:
+                        print(f"Error processing {current_url}: {e}")
+                        stats['errors'] += 1
+                        state.visit(current_url)
+                    continue
                 
-                # For markdown export, convert HTML to markdown and add to content
-                if markdown_export:
-                    # Extract main content area if possible, or use body
-                    main_content = soup.find('main') or soup.find('article') or soup.find('div', class_='content') or soup.body
-                    
-                    # Add a section header
-                    md_section = f"# {title}\n\n"
-                    
-                    # Convert HTML to markdown
-                    md_section += html_to_markdown(str(main_content), current_url, img_dir)
+                current_url, response, path = parses.pop(future)
+                state.visit(current_url)
+                try:
+                    page = future.result()
                     
-                    # Add URL reference
-                    md_section += f"\n\n---\n*Source: [{current_url}]({current_url})*\n\n"
-                    
-                    # Add to markdown content
-                    markdown_content.append({
-                        'url': current_url,
-                        'title': title,
-                        'content': md_section
-                    })
-                    
-                    print(f"Added {title} to markdown content")
-                else:
-                    # Create directory structure if doesn't exist
-                    file_path = os.path.join(output_dir, path)
-                    os.makedirs(os.path.dirname(file_path), exist_ok=True)
-                
-                # Extract all links in the page, unless we're in page-only mode
-                if not page_only:
-                    for link in soup.find_all('a', href=True):
-                        href = link['href']
-                        absolute_url = urljoin(current_url, href)
+                    # Check if this is a non-English page and we're in english_only mode
+                    if page['non_english']:
+                        print(f"Skipping non-English page: {current_url}")
+                        stats['skipped_non_english'] += 1
+                        continue
                         
-                        # Only follow links that belong to the same domain
-                        if is_valid_url(absolute_url, base_domain) and absolute_url not in visited_urls:
-                            # If in english_only mode, do a preliminary check on the URL
-                            if english_only and is_non_english_page(absolute_url):
-                                continue
-                            urls_to_visit.append(absolute_url)
-                
-                # Find and download resources like CSS, JavaScript, and images
-                # even in page-only mode, we need to download these resources
-                resource_urls = []
-                for tag, attr in [('link', 'href'), ('script', 'src'), ('img', 'src')]:
-                    for element in soup.find_all(tag, attrs={attr: True}):
-                        resource_url = urljoin(current_url, element[attr])
-                        if is_valid_url(resource_url, base_domain) and resource_url not in visited_urls:
-                            resource_urls.append(resource_url)
-                
-                # Add resource URLs to visit, even in page-only mode
-                for resource_url in resource_urls:
-                    if resource_url not in visited_urls:
-                        urls_to_visit.append(resource_url)
-                
-                # Wait before next request to avoid overwhelming the server
-                time.sleep(delay)
-            else:
-                print(f"Failed to retrieve {current_url}: Status code {response.status_code}")
-                stats['errors'] += 1
-                continue
-                
-        except Exception as e:
-            print(f"Error processing {current_url}: {e}")
-            stats['errors'] += 1
-            continue
-        
-        # Save the HTML content with updated links (if not in markdown mode)
-        if not markdown_export:
-            try:
-                # Create a new soup object for modifying links
-                soup = BeautifulSoup(response.text, 'html.parser')
-                
-                # Update all links (a href)
-                for a_tag in soup.find_all('a', href=True):
-                    href = a_tag['href']
-                    if href.startswith('#'):  # Skip anchor links
+                    if response.status_code == 200:
+                        title = page['title']
+                        
+                        # If in gallery mode, extract image IDs
+                        if gallery_mode:
+                            # Check if this is likely a gallery page (realtor.com or similar)
+                            domain = urlparse(current_url).netloc
+                            if 'realtor.com' in domain or _GALLERY_DOMAINS_RE.search(response.content):
+                                print("Detected possible gallery page, extracting image IDs...")
+                                ids = extract_image_ids(response.content)
+                                if ids:
+                                    state.add_gallery_ids(ids)
+                                    print(f"Found {len(ids)} gallery image IDs")
+                        
+                        # For markdown export, convert HTML to markdown and add to content
+                        if markdown_export:
+                            # Add a section header
+                            md_section = f"# {title}\n\n"
+                            
+                            # Convert HTML to markdown
+                            md_section += html_to_markdown(page['main_content'], current_url, img_dir, image_cache, session,
+                                                           saved_images)
+                            
+                            # Add URL reference
+                            md_section += f"\n\n---\n*Source: [{current_url}]({current_url})*\n\n"
+                            
+                            # Write the section out instead of keeping it in memory
+                            part = state.add_section(current_url, title)
+                            with open(os.path.join(md_parts_dir, f"{part}.md"), 'w', encoding='utf-8') as f:
+                                f.write(md_section)
+                            
+                            print(f"Added {title} to markdown content")
+                        
+                        # Queue links and resources (CSS, JavaScript, images) found in the page.
+                        # Links are not followed in page-only mode, but resources are still needed.
+                        # URLs already seen are skipped by the database
+                        new_urls = []
+                        rejected_urls = []
+                        for absolute_url, is_link in page['urls']:
+                            if is_link:
+                                if page_only:
+                                    continue
+                                # If in english_only mode, do a preliminary check on the URL.
+                                # Rejected URLs are remembered so they are never fetched
+                                if english_only and is_non_english_page(absolute_url):
+                                    rejected_urls.append((absolute_url, is_link))
+                                    continue
+                            
+                            new_urls.append((absolute_url, is_link))
+                        state.add_urls(new_urls)
+                        state.add_urls(rejected_urls, visited=0)
+                    else:
+                        print(f"Failed to retrieve {current_url}: Status code {response.status_code}")
+                        stats['errors'] += 1
                         continue
-                    absolute_url = urljoin(current_url, href)
-                    a_tag['href'] = convert_to_relative_url(path, absolute_url, base_domain, output_dir)
-                
-                # Update all image sources
-                for img_tag in soup.find_all('img', src=True):
-                    src = img_tag['src']
-                    absolute_url = urljoin(current_url, src)
-                    img_tag['src'] = convert_to_relative_url(path, absolute_url, base_domain, output_dir)
-                
-                # Update CSS links
-                for link_tag in soup.find_all('link', href=True):
-                    href = link_tag['href']
-                    absolute_url = urljoin(current_url, href)
-                    link_tag['href'] = convert_to_relative_url(path, absolute_url, base_domain, output_dir)
-                
-                # Update script sources
-                for script_tag in soup.find_all('script', src=True):
-                    src = script_tag['src']
-                    absolute_url = urljoin(current_url, src)
-                    script_tag['src'] = convert_to_relative_url(path, absolute_url, base_domain, output_dir)
-                
-                # Save the modified HTML content
-                file_path = os.path.join(output_dir, path)
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(str(soup))
-                print(f"Saved: {file_path} with updated links")
-                stats['downloaded'] += 1
+                        
+                except Exception as e:
+                    print(f"Error processing {current_url}: {e}")
+                    stats['errors'] += 1
+                    continue
                 
-            except Exception as e:
-                print(f"Error updating links in {file_path}: {e}")
-                stats['errors'] += 1
+                # Report the HTML content saved with updated links (if not in markdown mode)
+                if not markdown_export:
+                    if page['save_error']:
+                        print(f"Error updating links in {page['file_path']}: {page['save_error']}")
+                        stats['errors'] += 1
+                    else:
+                        print(f"Saved: {page['file_path']} with updated links")
+                        stats['downloaded'] += 1
+            
+            # Everything finished in this round is saved together
+            state.commit()
     
     # Process gallery images if in gallery mode
-    if gallery_mode and gallery_image_ids:
+    gallery_image_ids = state.gallery_ids() if gallery_mode else []
+    if gallery_image_ids:
         print("\nDownloading gallery images...")
         # Generate gallery image URLs (currently only supports REA Global)
         gallery_urls = generate_gallery_urls(gallery_image_ids, 's1.rea.global', country_code)
         if gallery_urls:
             # Download gallery images
-            downloaded_gallery_images = download_gallery_images(gallery_urls, gallery_dir)
+            downloaded_gallery_images = download_gallery_images(gallery_urls, gallery_dir, session=session)
             stats['gallery_images'] = len(downloaded_gallery_images)
     
     # Save all discovered URLs to a text file
     urls_file = os.path.join(output_dir, 'all_urls.txt')
     with open(urls_file, 'w', encoding='utf-8') as f:
-        for url in visited_urls:
-            f.write(f"{url}\n")
+        f.writelines(f"{visited_url}\n" for visited_url in state.visited_urls())
     
     # If in markdown mode, save the markdown content
     if markdown_export:
-        # Sort sections - put homepage first, then alphabetically by title
-        markdown_content.sort(key=lambda x: (0 if x['url'] == url else 1, x['title']))
+        # Sort sections - put homepage first, then alphabetically by title.
+        # Pages finish in any order, so the URL breaks ties between equal titles
+        markdown_content = [
+            {'url': section_url, 'title': title, 'part_file': os.path.join(md_parts_dir, f"{part}.md")}
+            for part, section_url, title in state.sections(url)
+        ]
         
         # Create the markdown file
         domain = urlparse(url).netloc
         md_file = os.path.join(output_dir, f"{domain}.md")
         
+        # Title
+        md_parts = [f"# {domain} Website Content\n\n"]
+        
+        # Table of contents
+        md_parts.append("## Table of Contents\n\n")
+        for i, section in enumerate(markdown_content):
+            md_parts.append(f"{i+1}. [{section['title']}](#{section['title'].lower().replace(' ', '-')})\n")
+        
+        md_parts.append("\n---\n\n")
+        
         with open(md_file, 'w', encoding='utf-8') as f:
-            # Write title
-            f.write(f"# {domain} Website Content\n\n")
-            
-            # Write table of contents
-            f.write("## Table of Contents\n\n")
-            for i, section in enumerate(markdown_content):
-                f.write(f"{i+1}. [{section['title']}](#{section['title'].lower().replace(' ', '-')})\n")
+            f.write("".join(md_parts))
             
-            f.write("\n---\n\n")
-            
-            # Write content
+            # Copy each section from its part file, one page in memory at a time
             for section in markdown_content:
-                f.write(section['content'])
+                with open(section['part_file'], 'r', encoding='utf-8') as part:
+                    shutil.copyfileobj(part, f)
                 f.write("\n\n---\n\n")
             
             # Write footer
             f.write(f"\n\n*This markdown file was generated from {url} on {time.strftime('%Y-%m-%d')}*\n")
         
+        shutil.rmtree(md_parts_dir)
+        
         print(f"\nMarkdown export completed! Created {md_file}")
         print(f"Images saved to: {img_dir}")
         stats['downloaded'] = len(markdown_content)
     
-    print(f"\nDownload completed! Found {len(visited_urls)} URLs.")
+    print(f"\nDownload completed! Found {state.visited_count()} URLs.")
+    state.close(remove=True)
     print(f"Pages downloaded: {stats['downloaded']}")
     if english_only:
         print(f"Non-English pages skipped: {stats['skipped_non_english']}")
@@ -652,6 +1109,13 @@ def download_website(url, output_dir=None, delay=0.5, english_only=False, markdo
         if page_only:
             print(f"Page-only mode: Only downloaded the specified page and its resources.")
 
+def positive_int(value):
+    """argparse type for counts that must be at least 1."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
 def main():
     parser = argparse.ArgumentParser(description='Download all URLs from a website')
     parser.add_argument('-d', '--download', metavar='URL', help='URL to download')
@@ -662,13 +1126,15 @@ def main():
     parser.add_argument('-p', '--page-only', action='store_true', help='Download only the specified page and its resources')
     parser.add_argument('-g', '--gallery-mode', action='store_true', help='Extract and download gallery images (works with realtor.com)')
     parser.add_argument('-c', '--country-code', default='cr', help='Country code for gallery images (default: cr)')
+    parser.add_argument('-w', '--workers', type=positive_int, default=8, help='Number of concurrent requests (default: 8)')
+    parser.add_argument('--resume', action='store_true', help='Continue an interrupted download into the same output directory')
     
     args = parser.parse_args()
     
     if args.download:
         # Remove @ symbol if present (as shown in example)
         url = args.download.lstrip('@')
-        download_website(url, args.output, args.delay, args.english_only, args.markdown, args.page_only, args.gallery_mode, args.country_code)
+        download_website(url, args.output, args.delay, args.english_only, args.markdown, args.page_only, args.gallery_mode, args.country_code, args.workers, args.resume)
     else:
         parser.print_help()
 